@@ -119,6 +119,7 @@ rsync -a \
     --exclude='*.pyc' \
     --exclude='.env' \
     --exclude='subscription.yaml' \
+    --exclude='subscription.cache.pkl' \
     --exclude='config.yaml' \
     --exclude='*.log' \
     --exclude='dist/' \
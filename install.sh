@@ -143,6 +143,7 @@ mkdir -p "$INSTALL_DIR"
 rsync -a \
     --exclude='.env' \
     --exclude='subscription.yaml' \
+    --exclude='subscription.cache.pkl' \
     --exclude='config.yaml' \
     --exclude='*.log' \
     --exclude='.venv/' \
@@ -180,7 +181,7 @@ if [[ "$OFFLINE" == "true" ]]; then
     echo "  python3 和 curl 已就绪"
 else
     sudo apt-get update -qq
-    sudo apt-get install -y -qq python3 curl
+    sudo apt-get install -y -qq python3 curl libyaml-0-2
 fi
 
 # ===== [3/7] 安装 uv =====
@@ -11,20 +11,99 @@ generate_config.py - 根据订阅内容生成 Mihomo (Clash Meta) 配置文件
         --output config.yaml \
         --best-node "节点名称" \
         --mixed-port 7893 \
-        --api-port 9090
+        --api-port 9090 \
+        --format yaml
 """
 import argparse
+import datetime
+import json
 import sys
 
 import yaml
 
+from subscription_cache import load_subscription_proxies
+
+# 优先使用 libyaml 的 C 实现, 未编译 libyaml 时回退到纯 Python 版本
+try:
+    from yaml import CSafeDumper as _SafeDumper
+except ImportError:
+    from yaml import SafeDumper as _SafeDumper
+
+# JSON 输出优先使用 orjson (可选依赖), 未安装时回退到标准库 json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# 输出文件写缓冲: YAML emitter 会产生大量小块 write, 用大缓冲合并为少量系统调用
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# ===== 配置中的静态部分 (模块加载时构建一次, build_config 中浅拷贝使用) =====
+GEOX_URL = {
+    "geoip": "https://github.com/MetaCubeX/meta-rules-dat/releases/latest/download/geoip.dat",
+    "geosite": "https://github.com/MetaCubeX/meta-rules-dat/releases/latest/download/geosite.dat",
+    "mmdb": "https://github.com/MetaCubeX/meta-rules-dat/releases/latest/download/country.mmdb",
+}
+
+DNS_FAKE_IP_FILTER = [
+    "*.lan",
+    "*.local",
+    "localhost.ptlogin2.qq.com",
+    "+.stun.*.*",
+    "+.stun.*.*.*",
+    "+.stun.*.*.*.*",
+    "*.n.n.srv.nintendo.net",
+    "+.stun.playstation.net",
+    "xbox.*.*.microsoft.com",
+    "*.*.xboxlive.com",
+    "*.msftncsi.com",
+    "*.msftconnecttest.com",
+]
+
+DNS_DEFAULT_NAMESERVER = [
+    "223.5.5.5",
+    "119.29.29.29",
+]
+
+DNS_NAMESERVER = [
+    "https://doh.pub/dns-query",
+    "https://dns.alidns.com/dns-query",
+]
+
+DNS_FALLBACK = [
+    "https://1.1.1.1/dns-query",
+    "https://dns.google/dns-query",
+    "tls://8.8.8.8:853",
+]
+
+DNS_FALLBACK_IPCIDR = [
+    "240.0.0.0/4",
+]
+
+HEALTH_CHECK_URL = "http://www.gstatic.com/generate_204"
+
+RULES = [
+    # 私有地址直连
+    "GEOIP,private,DIRECT,no-resolve",
+    # 国内流量直连
+    "GEOSITE,cn,DIRECT",
+    "GEOIP,CN,DIRECT,no-resolve",
+    # 常见海外服务走代理
+    "GEOSITE,google,Proxy",
+    "GEOSITE,github,Proxy",
+    "GEOSITE,twitter,Proxy",
+    "GEOSITE,telegram,Proxy",
+    "GEOSITE,youtube,Proxy",
+    # 默认走代理
+    "MATCH,Proxy",
+]
+
 
 def load_proxies(sub_file: str) -> list[dict]:
-    """从订阅文件加载代理节点列表"""
-    with open(sub_file, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
+    """从订阅文件加载代理节点列表 (优先使用 subscription.cache.pkl 解析缓存)"""
+    proxies = load_subscription_proxies(sub_file)
 
-    proxies = data.get("proxies", [])
     if not proxies:
         print("错误: 订阅文件中没有代理节点", file=sys.stderr)
         sys.exit(1)
@@ -40,6 +119,7 @@ def build_config(
     controller_host: str,
     api_secret: str,
     proxy_mode: str,
+    proxy_names: list[str] | None = None,
 ) -> dict:
     """
     构建完整的 Mihomo 配置
@@ -52,11 +132,13 @@ def build_config(
         controller_host: Mihomo external-controller 监听地址
         api_secret: Mihomo REST API Bearer secret (空字符串 = 不鉴权)
         proxy_mode: process-proxy 或 gateway-proxy
+        proxy_names: 节点名称列表 (调用方已计算时传入, 避免重复遍历 proxies)
     """
-    proxy_names = [p["name"] for p in proxies]
+    if proxy_names is None:
+        proxy_names = [p["name"] for p in proxies]
 
     # 将最快节点排到首位
-    ordered_names = [best_node] + [n for n in proxy_names if n != best_node]
+    ordered_names = [best_node, *(n for n in proxy_names if n != best_node)]
 
     # DNS 监听地址: gateway-proxy 需绑定所有接口供局域网使用;
     # process-proxy 只服务本机, 绑定 127.0.0.1 避免暴露 DNS 解析器到局域网
@@ -78,11 +160,7 @@ def build_config(
         "find-process-mode": "off",
         # ===== GeoIP =====
         "geodata-mode": True,
-        "geox-url": {
-            "geoip": "https://github.com/MetaCubeX/meta-rules-dat/releases/latest/download/geoip.dat",
-            "geosite": "https://github.com/MetaCubeX/meta-rules-dat/releases/latest/download/geosite.dat",
-            "mmdb": "https://github.com/MetaCubeX/meta-rules-dat/releases/latest/download/country.mmdb",
-        },
+        "geox-url": dict(GEOX_URL),
         # ===== DNS 设置 =====
         "dns": {
             "enable": True,
@@ -90,39 +168,14 @@ def build_config(
             "listen": f"{dns_listen_host}:1053",
             "enhanced-mode": "fake-ip",
             "fake-ip-range": "198.18.0.1/16",
-            "fake-ip-filter": [
-                "*.lan",
-                "*.local",
-                "localhost.ptlogin2.qq.com",
-                "+.stun.*.*",
-                "+.stun.*.*.*",
-                "+.stun.*.*.*.*",
-                "*.n.n.srv.nintendo.net",
-                "+.stun.playstation.net",
-                "xbox.*.*.microsoft.com",
-                "*.*.xboxlive.com",
-                "*.msftncsi.com",
-                "*.msftconnecttest.com",
-            ],
-            "default-nameserver": [
-                "223.5.5.5",
-                "119.29.29.29",
-            ],
-            "nameserver": [
-                "https://doh.pub/dns-query",
-                "https://dns.alidns.com/dns-query",
-            ],
-            "fallback": [
-                "https://1.1.1.1/dns-query",
-                "https://dns.google/dns-query",
-                "tls://8.8.8.8:853",
-            ],
+            "fake-ip-filter": list(DNS_FAKE_IP_FILTER),
+            "default-nameserver": list(DNS_DEFAULT_NAMESERVER),
+            "nameserver": list(DNS_NAMESERVER),
+            "fallback": list(DNS_FALLBACK),
             "fallback-filter": {
                 "geoip": True,
                 "geoip-code": "CN",
-                "ipcidr": [
-                    "240.0.0.0/4",
-                ],
+                "ipcidr": list(DNS_FALLBACK_IPCIDR),
             },
         },
         # ===== 代理节点 =====
@@ -138,7 +191,7 @@ def build_config(
                 "name": "Auto",
                 "type": "url-test",
                 "proxies": proxy_names,
-                "url": "http://www.gstatic.com/generate_204",
+                "url": HEALTH_CHECK_URL,
                 "interval": 300,
                 "tolerance": 50,
             },
@@ -146,59 +199,80 @@ def build_config(
                 "name": "Fallback",
                 "type": "fallback",
                 "proxies": ordered_names,
-                "url": "http://www.gstatic.com/generate_204",
+                "url": HEALTH_CHECK_URL,
                 "interval": 300,
             },
         ],
         # ===== 分流规则 =====
-        "rules": [
-            # 私有地址直连
-            "GEOIP,private,DIRECT,no-resolve",
-            # 国内流量直连
-            "GEOSITE,cn,DIRECT",
-            "GEOIP,CN,DIRECT,no-resolve",
-            # 常见海外服务走代理
-            "GEOSITE,google,Proxy",
-            "GEOSITE,github,Proxy",
-            "GEOSITE,twitter,Proxy",
-            "GEOSITE,telegram,Proxy",
-            "GEOSITE,youtube,Proxy",
-            # 默认走代理
-            "MATCH,Proxy",
-        ],
+        "rules": list(RULES),
     }
 
     return config
 
 
-def write_config(config: dict, output_file: str):
-    """将配置写入 YAML 文件"""
+def _json_default(obj):
+    """
+    标准库 json 的兜底序列化
+
+    YAML 安全加载器会把 2024-01-01 之类的值解析为 date/datetime,
+    与 orjson 一致输出为 ISO 格式字符串; 其余类型与 orjson 一样报 TypeError。
+    """
+    if isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
 
-    # 自定义 Dumper: 确保中文不被转义, 保持键顺序
-    class ConfigDumper(yaml.SafeDumper):
-        pass
+def _write_json_config(config: dict, output_file: str):
+    """
+    将配置写入 JSON 文件
 
-    # 禁止 YAML 自动排序
-    def _dict_representer(dumper, data):
-        return dumper.represent_mapping(
-            yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG, data.items()
+    JSON 是 YAML 的子集, Mihomo 可直接加载; 跳过 YAML 逐节点的 representer 调用。
+    JSON 不支持注释, 因此不写入文件头。
+    """
+    if orjson is not None:
+        data = orjson.dumps(
+            config, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
         )
+    else:
+        data = json.dumps(
+            config, ensure_ascii=False, indent=2, default=_json_default
+        ).encode("utf-8")
 
-    ConfigDumper.add_representer(dict, _dict_representer)
+    with open(output_file, "wb", buffering=WRITE_BUFFER_SIZE) as f:
+        f.write(data)
+        f.write(b"\n")
 
-    with open(output_file, "w", encoding="utf-8") as f:
+
+def _write_yaml_config(config: dict, output_file: str):
+    """
+    将配置写入 YAML 文件
+
+    dict 本身保持插入顺序, sort_keys=False 即可按 build_config 中的顺序输出,
+    无需自定义 representer; allow_unicode 保证中文节点名不被转义。
+    """
+    with open(
+        output_file, "w", encoding="utf-8", buffering=WRITE_BUFFER_SIZE
+    ) as f:
         f.write("# Mihomo 配置文件 (由 auto-mihomo 自动生成, 请勿手动修改)\n")
-        f.write(f"# 生成时间: {__import__('datetime').datetime.now().isoformat()}\n\n")
+        f.write(f"# 生成时间: {datetime.datetime.now().isoformat()}\n\n")
         yaml.dump(
             config,
             f,
-            Dumper=ConfigDumper,
+            Dumper=_SafeDumper,
             default_flow_style=False,
             allow_unicode=True,
             sort_keys=False,
             width=120,
         )
 
+
+def write_config(config: dict, output_file: str, fmt: str = "yaml"):
+    """将配置写入文件 (fmt: yaml 或 json)"""
+    if fmt == "json":
+        _write_json_config(config, output_file)
+    else:
+        _write_yaml_config(config, output_file)
+
     print(f"配置已写入: {output_file}", file=sys.stderr)
 
 
@@ -225,12 +299,18 @@ def main():
         default="process-proxy",
         help="代理模式: process-proxy(默认)/gateway-proxy",
     )
+    parser.add_argument(
+        "--format",
+        choices=["yaml", "json"],
+        default="yaml",
+        help="输出格式: yaml(默认)/json (JSON 为 YAML 子集, Mihomo 同样可加载)",
+    )
     args = parser.parse_args()
 
     proxies = load_proxies(args.subscription)
 
     # 验证 best-node 存在于代理列表中
-    proxy_names = {p["name"] for p in proxies}
+    proxy_names = [p["name"] for p in proxies]
     if args.best_node not in proxy_names:
         print(
             f"警告: 指定的最快节点 '{args.best_node}' 不在代理列表中, "
@@ -247,8 +327,9 @@ def main():
         args.controller_host,
         args.api_secret,
         args.proxy_mode,
+        proxy_names,
     )
-    write_config(config, args.output)
+    write_config(config, args.output, args.format)
 
 
 if __name__ == "__main__":
@@ -21,6 +21,9 @@ mcp_server.py - MCP HTTP 接口
 """
 import asyncio
 import os
+import re
+import time
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -41,11 +44,33 @@ MCP_API_TOKEN = os.getenv("MCP_API_TOKEN", "")
 MIHOMO_API_BASE = f"http://{API_HOST}:{API_PORT}"
 MCP_SERVER_HOST = os.getenv("MCP_SERVER_HOST", "127.0.0.1")
 
+# ===== Mihomo API 客户端 =====
+# 各端点共享同一个连接池; 在应用启动时创建 (此时 .env 已加载), 关闭时释放
+_mihomo_client: httpx.AsyncClient | None = None
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    global _mihomo_client
+    _mihomo_client = httpx.AsyncClient(
+        base_url=MIHOMO_API_BASE,
+        headers=_auth_headers(),
+        timeout=10,
+        limits=httpx.Limits(max_keepalive_connections=20),
+    )
+    try:
+        yield
+    finally:
+        await _mihomo_client.aclose()
+        _mihomo_client = None
+
+
 # ===== FastAPI 应用 =====
 app = FastAPI(
     title="Auto-Mihomo MCP Server",
     description="MCP HTTP 接口 - 代理订阅管理与节点切换",
     version="1.0.0",
+    lifespan=_lifespan,
 )
 
 # ===== 全局状态 =====
@@ -56,6 +81,32 @@ _state = {
     "update_count": 0,
 }
 
+# /mcp/nodes 响应缓存: group -> (monotonic 时间戳, 响应体)
+# 面板/客户端通常每隔几秒轮询一次, 短 TTL 内直接复用上次结果
+NODES_CACHE_TTL = 2.0
+_nodes_cache: dict[str, tuple[float, dict]] = {}
+# 每次失效时递增; 请求开始前记录, 拉取期间若已失效则不写回旧结果
+_nodes_cache_generation = 0
+
+
+def _invalidate_nodes_cache():
+    """清空 /mcp/nodes 缓存 (节点切换或订阅更新后调用)"""
+    global _nodes_cache_generation
+    _nodes_cache_generation += 1
+    _nodes_cache.clear()
+
+
+# 按秒缓存的 ISO 时间戳: [epoch 秒, isoformat 字符串]
+_ts_cache: list = [0, ""]
+
+
+def _now_iso() -> str:
+    """当前本地时间的 ISO 字符串 (秒级精度, 同一秒内复用)"""
+    t = int(time.time())
+    if t != _ts_cache[0]:
+        _ts_cache[:] = [t, datetime.fromtimestamp(t).isoformat()]
+    return _ts_cache[1]
+
 
 def _auth_headers() -> dict[str, str]:
     if not MIHOMO_API_SECRET:
@@ -106,8 +157,29 @@ class NodeInfo(BaseModel):
 
 
 # ===== 后台更新任务 =====
+# 更新结果中保留的 stdout/stderr 末尾字符数
+OUTPUT_TAIL_CHARS = 3000
+
+
+async def _read_tail(stream: asyncio.StreamReader, max_chars: int) -> str:
+    """
+    边读边截断子进程输出, 只保留末尾 max_chars 个字符
+
+    UTF-8 单字符最多 4 字节, 缓冲区只需保留 max_chars * 4 字节,
+    内存占用与子进程输出总量无关
+    """
+    max_bytes = max_chars * 4
+    buf = bytearray()
+    while chunk := await stream.read(4096):
+        buf.extend(chunk)
+        if len(buf) > max_bytes * 2:
+            del buf[:-max_bytes]
+    return buf[-max_bytes:].decode("utf-8", errors="replace")[-max_chars:]
+
+
 async def _run_update():
     """在后台执行 update_sub.sh"""
+    proc = None
     try:
         proc = await asyncio.create_subprocess_exec(
             "bash",
@@ -117,15 +189,25 @@ async def _run_update():
             stderr=asyncio.subprocess.PIPE,
             cwd=str(PROJECT_DIR),
         )
-        stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=180)
+        stdout, stderr, _ = await asyncio.wait_for(
+            asyncio.gather(
+                _read_tail(proc.stdout, OUTPUT_TAIL_CHARS),
+                _read_tail(proc.stderr, OUTPUT_TAIL_CHARS),
+                proc.wait(),
+            ),
+            timeout=180,
+        )
 
         _state["last_update_result"] = {
             "success": proc.returncode == 0,
             "returncode": proc.returncode,
-            "stdout": stdout.decode("utf-8", errors="replace")[-3000:],
-            "stderr": stderr.decode("utf-8", errors="replace")[-3000:],
+            "stdout": stdout,
+            "stderr": stderr,
         }
     except asyncio.TimeoutError:
+        # 超时后不再读取管道, 结束子进程以免其阻塞在写满的管道上
+        if proc is not None and proc.returncode is None:
+            proc.kill()
         _state["last_update_result"] = {
             "success": False,
             "error": "更新超时 (180s)",
@@ -137,8 +219,9 @@ async def _run_update():
         }
     finally:
         _state["update_running"] = False
-        _state["last_update_time"] = datetime.now().isoformat()
+        _state["last_update_time"] = _now_iso()
         _state["update_count"] += 1
+        _invalidate_nodes_cache()
 
 
 # ===== API 端点 =====
@@ -157,7 +240,7 @@ async def trigger_update(request: Request):
         return UpdateResponse(
             status="busy",
             message="更新正在进行中, 请稍后再试",
-            timestamp=datetime.now().isoformat(),
+            timestamp=_now_iso(),
         )
 
     _state["update_running"] = True
@@ -166,7 +249,7 @@ async def trigger_update(request: Request):
     return UpdateResponse(
         status="accepted",
         message="更新任务已提交, 请通过 /mcp/status 查询进度",
-        timestamp=datetime.now().isoformat(),
+        timestamp=_now_iso(),
     )
 
 
@@ -191,43 +274,44 @@ async def switch_node(req: SwitchRequest, request: Request):
     """
     _require_mcp_token(request)
     try:
-        async with httpx.AsyncClient(timeout=10, headers=_auth_headers()) as client:
-            # 验证代理组存在
-            resp = await client.get(f"{MIHOMO_API_BASE}/proxies/{req.group}")
-            if resp.status_code != 200:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"代理组 '{req.group}' 不存在",
-                )
-
-            group_data = resp.json()
-            available = [p for p in group_data.get("all", [])]
+        # 验证代理组存在
+        resp = await _mihomo_client.get(f"/proxies/{req.group}")
+        if resp.status_code != 200:
+            raise HTTPException(
+                status_code=404,
+                detail=f"代理组 '{req.group}' 不存在",
+            )
 
-            if req.node not in available:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"节点 '{req.node}' 不在代理组 '{req.group}' 中, "
-                    f"可用节点: {available[:20]}...",
-                )
+        group_data = resp.json()
+        available = group_data.get("all") or []
+        available_set = set(available)
 
-            # 执行切换
-            resp = await client.put(
-                f"{MIHOMO_API_BASE}/proxies/{req.group}",
-                json={"name": req.node},
+        if req.node not in available_set:
+            raise HTTPException(
+                status_code=400,
+                detail=f"节点 '{req.node}' 不在代理组 '{req.group}' 中, "
+                f"可用节点: {available[:20]}...",
             )
 
-            if resp.status_code == 204:
-                return SwitchResponse(
-                    status="ok",
-                    message=f"已切换到 {req.node}",
-                    node=req.node,
-                    group=req.group,
-                )
-            else:
-                raise HTTPException(
-                    status_code=500,
-                    detail=f"切换失败: HTTP {resp.status_code} - {resp.text}",
-                )
+        # 执行切换
+        resp = await _mihomo_client.put(
+            f"/proxies/{req.group}",
+            json={"name": req.node},
+        )
+
+        if resp.status_code == 204:
+            _invalidate_nodes_cache()
+            return SwitchResponse(
+                status="ok",
+                message=f"已切换到 {req.node}",
+                node=req.node,
+                group=req.group,
+            )
+        else:
+            raise HTTPException(
+                status_code=500,
+                detail=f"切换失败: HTTP {resp.status_code} - {resp.text}",
+            )
 
     except httpx.ConnectError:
         raise HTTPException(
@@ -243,45 +327,53 @@ async def list_nodes(
 ):
     """列出指定代理组中的所有节点及其延迟信息"""
     _require_mcp_token(request)
-    try:
-        async with httpx.AsyncClient(timeout=10, headers=_auth_headers()) as client:
-            resp = await client.get(f"{MIHOMO_API_BASE}/proxies/{group}")
-            if resp.status_code != 200:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"代理组 '{group}' 不存在",
-                )
+    cached = _nodes_cache.get(group)
+    if cached and time.monotonic() - cached[0] < NODES_CACHE_TTL:
+        return cached[1]
 
-            group_data = resp.json()
-            all_names = group_data.get("all", [])
-            now_node = group_data.get("now", "")
+    generation = _nodes_cache_generation
+    try:
+        # 一次请求获取全部代理 (含代理组), 避免逐节点请求
+        resp = await _mihomo_client.get("/proxies")
+        all_proxies = (
+            resp.json().get("proxies", {}) if resp.status_code == 200 else {}
+        )
+        group_data = all_proxies.get(group)
+        if group_data is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"代理组 '{group}' 不存在",
+            )
 
-            # 获取各节点详情
-            nodes = []
-            for name in all_names:
-                node_resp = await client.get(
-                    f"{MIHOMO_API_BASE}/proxies/{name}"
+        all_names = group_data.get("all", [])
+        now_node = group_data.get("now", "")
+
+        # 从内存中的代理表查找各节点详情
+        nodes = []
+        for name in all_names:
+            nd = all_proxies.get(name)
+            if nd is not None:
+                history = nd.get("history", [])
+                last_delay = history[-1].get("delay", 0) if history else 0
+                nodes.append(
+                    {
+                        "name": nd.get("name", name),
+                        "type": nd.get("type", "unknown"),
+                        "alive": nd.get("alive", False),
+                        "delay": last_delay,
+                        "current": name == now_node,
+                    }
                 )
-                if node_resp.status_code == 200:
-                    nd = node_resp.json()
-                    history = nd.get("history", [])
-                    last_delay = history[-1].get("delay", 0) if history else 0
-                    nodes.append(
-                        {
-                            "name": nd.get("name", name),
-                            "type": nd.get("type", "unknown"),
-                            "alive": nd.get("alive", False),
-                            "delay": last_delay,
-                            "current": name == now_node,
-                        }
-                    )
-
-            return {
-                "group": group,
-                "current": now_node,
-                "total": len(nodes),
-                "nodes": nodes,
-            }
+
+        result = {
+            "group": group,
+            "current": now_node,
+            "total": len(nodes),
+            "nodes": nodes,
+        }
+        if generation == _nodes_cache_generation:
+            _nodes_cache[group] = (time.monotonic(), result)
+        return result
 
     except httpx.ConnectError:
         raise HTTPException(
@@ -298,11 +390,10 @@ async def health_check(request: Request):
     mihomo_version = None
 
     try:
-        async with httpx.AsyncClient(timeout=5, headers=_auth_headers()) as client:
-            resp = await client.get(f"{MIHOMO_API_BASE}/version")
-            if resp.status_code == 200:
-                mihomo_ok = True
-                mihomo_version = resp.json().get("version", "unknown")
+        resp = await _mihomo_client.get("/version", timeout=5)
+        if resp.status_code == 200:
+            mihomo_ok = True
+            mihomo_version = resp.json().get("version", "unknown")
     except Exception:
         pass
 
@@ -310,7 +401,7 @@ async def health_check(request: Request):
         "mcp_server": "ok",
         "mihomo": "ok" if mihomo_ok else "unreachable",
         "mihomo_version": mihomo_version,
-        "timestamp": datetime.now().isoformat(),
+        "timestamp": _now_iso(),
     }
 
 
@@ -321,12 +412,13 @@ if __name__ == "__main__":
     # 加载 .env
     env_file = PROJECT_DIR / ".env"
     if env_file.exists():
-        with open(env_file) as f:
-            for line in f:
-                line = line.strip()
-                if line and not line.startswith("#") and "=" in line:
-                    key, _, value = line.partition("=")
-                    os.environ.setdefault(key.strip(), value.strip())
+        # 一次读取 + 正则扫描; 注释行 (# 开头) 不匹配变量名, 自然跳过
+        for m in re.finditer(
+            r"^[ \t]*([A-Za-z_][A-Za-z0-9_]*)[ \t]*=[ \t]*(.*?)[ \t\r]*$",
+            env_file.read_text(),
+            re.M,
+        ):
+            os.environ.setdefault(m.group(1), m.group(2))
 
     API_PORT = int(os.getenv("MIHOMO_API_PORT", "9090"))
     API_HOST = os.getenv("MIHOMO_CONTROLLER_HOST", "127.0.0.1")
@@ -0,0 +1,70 @@
+"""
+subscription_cache.py - 订阅代理节点解析与缓存 (供 test_nodes.py / generate_config.py 共用)
+
+订阅解析结果以 pickle 缓存到同目录的 subscription.cache.pkl,
+缓存中记录订阅文件的 mtime/大小, 订阅更新后自动失效并重新解析 YAML。
+
+缓存格式 (两个脚本之间的约定):
+    {"source": (st_mtime_ns, st_size), "proxies": [...]}
+"""
+import os
+import pickle
+from pathlib import Path
+
+import yaml
+
+# 优先使用 libyaml 的 C 实现, 未编译 libyaml 时回退到纯 Python 版本
+try:
+    from yaml import CSafeLoader as _SafeLoader
+except ImportError:
+    from yaml import SafeLoader as _SafeLoader
+
+
+def cache_path(sub_file: str) -> Path:
+    """订阅解析缓存路径: subscription.yaml → subscription.cache.pkl"""
+    return Path(sub_file).with_suffix(".cache.pkl")
+
+
+def _source_key(sub_file: str) -> tuple[int, int]:
+    st = os.stat(sub_file)
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _load_cached_proxies(sub_file: str) -> list[dict] | None:
+    """读取解析缓存; 缓存缺失、损坏或与订阅文件不一致时返回 None"""
+    # 缓存仅为加速, 任何读取异常 (损坏/版本不兼容等) 都回退到重新解析
+    try:
+        source = _source_key(sub_file)
+        with open(cache_path(sub_file), "rb") as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+
+    if not isinstance(cached, dict) or cached.get("source") != source:
+        return None
+    proxies = cached.get("proxies")
+    return proxies if isinstance(proxies, list) else None
+
+
+def _save_cached_proxies(sub_file: str, proxies: list[dict]):
+    """写入解析缓存 (先写临时文件再替换, 失败时静默忽略)"""
+    cache_file = cache_path(sub_file)
+    tmp_file = cache_file.with_name(cache_file.name + ".tmp")
+    try:
+        source = _source_key(sub_file)
+        with open(tmp_file, "wb") as f:
+            pickle.dump({"source": source, "proxies": proxies}, f, protocol=5)
+        os.replace(tmp_file, cache_file)
+    except Exception:
+        pass
+
+
+def load_subscription_proxies(sub_file: str) -> list[dict]:
+    """从订阅文件加载代理节点列表 (优先使用解析缓存, 未命中时解析 YAML 并写入缓存)"""
+    proxies = _load_cached_proxies(sub_file)
+    if proxies is None:
+        with open(sub_file, "r", encoding="utf-8") as f:
+            data = yaml.load(f, Loader=_SafeLoader)
+        proxies = data.get("proxies", [])
+        _save_cached_proxies(sub_file, proxies)
+    return proxies
@@ -3,50 +3,140 @@
 test_nodes.py - 并发 TCP 连接测试所有代理节点延迟
 
 从 subscription.yaml 中提取所有代理节点的 server:port,
-使用线程池并发进行 TCP 连接测试, 测量延迟并返回最快节点名称。
+使用 asyncio 并发进行 TCP 连接测试, 测量延迟并返回最快节点名称。
 
 用法:
     python3 test_nodes.py --subscription subscription.yaml
     python3 test_nodes.py --subscription subscription.yaml --workers 100 --timeout 5
 """
 import argparse
+import asyncio
+import heapq
 import re
 import socket
+import struct
 import sys
-import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 
-import yaml
+from subscription_cache import load_subscription_proxies
 
+# uvloop (随 uvicorn[standard] 安装) 的事件循环开销更低, 未安装时使用默认循环
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
 
-def test_tcp_latency(proxy: dict, timeout: int) -> tuple[str, str, int, int]:
+
+# SO_LINGER (l_onoff=1, l_linger=0): close 时直接发送 RST 而不进入 TIME_WAIT,
+# 频繁重复测试时不会占满本机临时端口
+LINGER_RST = struct.pack("ii", 1, 0)
+
+
+async def resolve_hosts(
+    hosts: set[str], dns_timeout: float, workers: int
+) -> dict[str, str | None]:
+    """
+    并发预解析所有不重复的主机名 (IPv4)
+
+    多个节点常共用同一域名, 每个域名只解析一次, 后续 TCP 测试直接连接 IP,
+    测得的延迟不再包含 DNS 解析耗时。
+
+    整个解析阶段最多耗时 dns_timeout 秒; 届时仍未完成的域名记为 None
+    (对应节点判为不可达), 已完成的结果照常使用。
+    """
+    loop = asyncio.get_running_loop()
+    sem = asyncio.Semaphore(workers)
+    resolved: dict[str, str | None] = dict.fromkeys(hosts)
+
+    async def resolve(host: str):
+        async with sem:
+            try:
+                # 显式走默认线程池 (uvloop 的 getaddrinfo 使用仅 4 线程的 libuv 线程池)
+                infos = await loop.run_in_executor(
+                    None, socket.getaddrinfo, host, None,
+                    socket.AF_INET, socket.SOCK_STREAM,
+                )
+            except (socket.gaierror, UnicodeError, OSError):
+                return
+        if infos:
+            resolved[host] = infos[0][4][0]
+
+    tasks = [asyncio.ensure_future(resolve(h)) for h in hosts]
+    if tasks:
+        _, pending = await asyncio.wait(tasks, timeout=dns_timeout)
+        for task in pending:
+            task.cancel()
+    return resolved
+
+
+async def test_tcp_latency(
+    proxy: dict, ip: str | None, timeout: int
+) -> tuple[str, str, int, int]:
     """
     TCP 连接测试单个代理节点延迟
 
     Args:
         proxy: 代理节点字典, 包含 name/server/port
+        ip: 预解析得到的 server IP 地址 (None 表示解析失败)
         timeout: 连接超时时间 (秒)
 
     Returns:
         (节点名称, server:port, 延迟ms, 是否成功 0/1)
     """
     name = proxy.get("name", "unknown")
-    server = proxy.get("server", "")
-    port = int(proxy.get("port", 0))
+    server = proxy.get("server")
+    port = proxy.get("port")
 
+    # 缺少 server/port 或端口非法的节点直接判为不可达, 不拼接地址字符串
     if not server or not port:
-        return (name, f"{server}:{port}", 9999, 0)
-
+        return (name, "", 9999, 0)
     try:
-        start = time.monotonic()
-        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        sock.settimeout(timeout)
-        sock.connect((server, port))
-        latency_ms = int((time.monotonic() - start) * 1000)
+        port = int(port)
+    except (TypeError, ValueError):
+        return (name, "", 9999, 0)
+    if not 0 < port <= 65535:
+        return (name, "", 9999, 0)
+
+    addr = f"{server}:{port}"
+    if not ip:
+        return (name, addr, 9999, 0)
+
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, LINGER_RST)
+    sock.setblocking(False)
+    try:
+        start = loop.time()
+        await asyncio.wait_for(loop.sock_connect(sock, (ip, port)), timeout)
+        latency_ms = int((loop.time() - start) * 1000)
+        return (name, addr, latency_ms, 1)
+    except (asyncio.TimeoutError, OSError):
+        return (name, addr, 9999, 0)
+    finally:
         sock.close()
-        return (name, f"{server}:{port}", latency_ms, 1)
-    except (socket.timeout, ConnectionRefusedError, OSError):
-        return (name, f"{server}:{port}", 9999, 0)
+
+
+async def test_all(
+    proxies: list[dict], timeout: int, dns_timeout: float, workers: int
+) -> list[tuple[str, str, int, int]]:
+    """并发测试所有节点, 同时进行中的 DNS 解析/连接数均不超过 workers"""
+    # 默认线程池与 workers 同大小, 个别卡住的解析不会挤占其余域名的线程
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(max_workers=workers)
+    )
+    hosts = {p["server"] for p in proxies if p.get("server")}
+    resolved = await resolve_hosts(hosts, dns_timeout, workers)
+    failed = sum(1 for ip in resolved.values() if ip is None)
+    print(f"DNS 预解析: {len(hosts)} 个域名, 失败 {failed} 个", file=sys.stderr)
+
+    sem = asyncio.Semaphore(workers)
+
+    async def probe(proxy: dict) -> tuple[str, str, int, int]:
+        async with sem:
+            ip = resolved.get(proxy.get("server", ""))
+            return await test_tcp_latency(proxy, ip, timeout)
+
+    return await asyncio.gather(*(probe(p) for p in proxies))
 
 
 def main():
@@ -55,11 +145,15 @@ def main():
         "--subscription", required=True, help="订阅文件路径 (YAML)"
     )
     parser.add_argument(
-        "--workers", type=int, default=50, help="并发线程数 (默认: 50)"
+        "--workers", type=int, default=50, help="最大并发 DNS 解析/连接数 (默认: 50)"
     )
     parser.add_argument(
         "--timeout", type=int, default=3, help="TCP 连接超时秒数 (默认: 3)"
     )
+    parser.add_argument(
+        "--dns-timeout", type=float, default=5,
+        help="DNS 预解析阶段总超时秒数 (默认: 5)"
+    )
     parser.add_argument(
         "--top-n", type=int, default=1, help="输出延迟最低的前 N 个节点名称 (默认: 1)"
     )
@@ -86,10 +180,7 @@ def main():
         return any(p.search(name) for p in exclude_patterns)
 
     # 读取订阅文件
-    with open(args.subscription, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f)
-
-    proxies = data.get("proxies", [])
+    proxies = load_subscription_proxies(args.subscription)
     if exclude_patterns:
         before = len(proxies)
         proxies = [p for p in proxies if not is_excluded(p.get("name", ""))]
@@ -104,32 +195,27 @@ def main():
     print(f"共 {total} 个节点, 开始并发延迟测试...", file=sys.stderr)
 
     # 并发测试
-    results = []
-    with ThreadPoolExecutor(max_workers=args.workers) as executor:
-        futures = {
-            executor.submit(test_tcp_latency, proxy, args.timeout): proxy
-            for proxy in proxies
-        }
-        for future in as_completed(futures):
-            results.append(future.result())
-
-    # 按延迟排序
-    results.sort(key=lambda x: x[2])
+    results = asyncio.run(
+        test_all(proxies, args.timeout, args.dns_timeout, args.workers),
+        loop_factory=uvloop.new_event_loop if uvloop else None,
+    )
 
     # 统计
-    reachable = sum(1 for r in results if r[3] == 1)
-    print(f"可达节点: {reachable}/{total}", file=sys.stderr)
+    reachable = [r for r in results if r[3] == 1]
+    print(f"可达节点: {len(reachable)}/{total}", file=sys.stderr)
 
     # 打印 Top 10
     print("\n延迟排名 (Top 10):", file=sys.stderr)
     print(f"{'排名':<4} {'节点名称':<40} {'地址':<30} {'延迟':<8}", file=sys.stderr)
     print("-" * 82, file=sys.stderr)
-    for i, (name, addr, latency, ok) in enumerate(results[:10], 1):
+    # 只需前 N 名, 用 heapq 部分排序代替全量排序
+    top10 = heapq.nsmallest(10, results, key=lambda x: x[2])
+    for i, (name, addr, latency, ok) in enumerate(top10, 1):
         status = f"{latency}ms" if ok else "超时"
         print(f"{i:<4} {name:<40} {addr:<30} {status:<8}", file=sys.stderr)
 
     # 返回最快的 top-n 个节点
-    top = [r for r in results if r[3] == 1][: args.top_n]
+    top = heapq.nsmallest(args.top_n, reachable, key=lambda x: x[2])
     if not top:
         print("\n错误: 所有节点均不可达", file=sys.stderr)
         sys.exit(1)
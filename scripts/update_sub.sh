@@ -36,6 +36,7 @@ API_PORT="${MIHOMO_API_PORT:-9090}"
 API_HOST="${MIHOMO_CONTROLLER_HOST:-127.0.0.1}"
 API_SECRET="${MIHOMO_API_SECRET:-}"
 PROXY_MODE="${AUTO_MIHOMO_PROXY_MODE:-process-proxy}"
+CONFIG_FORMAT="${MIHOMO_CONFIG_FORMAT:-yaml}"
 HTTP_PROBE_URL="${MIHOMO_HTTP_PROBE_URL:-http://www.gstatic.com/generate_204}"
 HTTP_PROBE_TIMEOUT="${MIHOMO_HTTP_PROBE_TIMEOUT:-12}"
 MIHOMO_TEST_WORKERS="${MIHOMO_TEST_WORKERS:-50}"
@@ -219,7 +220,8 @@ generate_config() {
         --api-port "$API_PORT" \
         --controller-host "$API_HOST" \
         --api-secret "$API_SECRET" \
-        --proxy-mode "$PROXY_MODE"
+        --proxy-mode "$PROXY_MODE" \
+        --format "$CONFIG_FORMAT"
 
     log_info "配置文件已生成: ${CONFIG_FILE}"
 
@@ -669,6 +669,7 @@ main() {
     rsync -a \
         --exclude='.env' \
         --exclude='subscription.yaml' \
+        --exclude='subscription.cache.pkl' \
         --exclude='config.yaml' \
         --exclude='*.log' \
         --exclude='.venv/' \